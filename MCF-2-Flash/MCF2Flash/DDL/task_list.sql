@@ -13,11 +13,20 @@ CREATE TABLE collector_rest.tasks_list_v2
     `task_status`    int          DEFAULT NULL,
     `driver_info`    varchar(50)  DEFAULT NULL,
     `download_dir`   varchar(100) DEFAULT NULL,
-    `extra_content`  text
+    `extra_content`  text,
+    `claimed_by`     varchar(100) DEFAULT NULL COMMENT '认领该任务的worker标识',
+    `lease_expires_at` datetime   DEFAULT NULL COMMENT '任务认领租约的到期时间'
 )    DEFAULT CHARACTER SET utf8mb4
     COLLATE utf8mb4_general_ci
     COMMENT 'MCFv2批量模式-任务表';
 
 CREATE INDEX idx_task_content ON collector_rest.tasks_list_v2(task_content);
 CREATE INDEX idx_task_status ON collector_rest.tasks_list_v2(task_status);
-CREATE INDEX idx_task_uid ON collector_rest.tasks_list_v2(task_uid);
\ No newline at end of file
+CREATE INDEX idx_task_uid ON collector_rest.tasks_list_v2(task_uid);
+CREATE INDEX idx_task_claimed_by ON collector_rest.tasks_list_v2(claimed_by);
+
+-- 已有的表升级：增加任务认领所需的字段
+-- ALTER TABLE collector_rest.tasks_list_v2
+--     ADD COLUMN `claimed_by` varchar(100) DEFAULT NULL COMMENT '认领该任务的worker标识',
+--     ADD COLUMN `lease_expires_at` datetime DEFAULT NULL COMMENT '任务认领租约的到期时间';
+-- CREATE INDEX idx_task_claimed_by ON collector_rest.tasks_list_v2(claimed_by);
\ No newline at end of file
@@ -4,6 +4,8 @@ from celery.signals import worker_process_init, worker_process_shutdown
 from celery.schedules import crontab
 
 from MCF2Flash.mcf_2f.mcf_2f_core import MCF2FlashCore
+from MCF2Flash.commons.udao import dispose_shared_engines, close_shared_mongo_clients
+from MCF2Flash.commons.net_io import close_redis_pools
 from MCF2Flash.loguru_setup import loguru_setup
 from MCF2Flash.app_config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND, MCF2F_CONFIG
 
@@ -44,9 +46,14 @@ celery_app.conf.update(
 )
 
 celery_app.conf.beat_schedule = {
-    'run-tasks-not-done-every-2-minutes': {
+    # 新任务入库时会主动触发调度，这里仅作为兜底扫描
+    'run-tasks-not-done-every-10-minutes': {
         'task': 'run_tasks_not_done',
-        'schedule': crontab(minute='*/2'),  # 每2分钟执行一次
+        'schedule': crontab(minute='*/10'),  # 每10分钟执行一次
+    },
+    'reap-idle-browsers-every-minute': {
+        'task': 'reap_idle_browsers',
+        'schedule': crontab(minute='*'),  # 每分钟关闭一次空闲超时的浏览器
     },
 }
 
@@ -61,6 +68,9 @@ def init_mcf_obj(**_):
 @worker_process_shutdown.connect
 def shutdown_mcf_obj(**_):
     close_mcf()
+    dispose_shared_engines()
+    close_shared_mongo_clients()
+    close_redis_pools()
 
 
 celery_app.autodiscover_tasks()
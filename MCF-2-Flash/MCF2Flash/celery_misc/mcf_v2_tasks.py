@@ -8,10 +8,16 @@ sys.path.append("..")
 sys.path.append(str(t))
 from MCF2Flash.commons.udao import UniversalDAO
 from MCF2Flash.celery_core import celery_app, get_mcf
-from MCF2Flash.app_config import MCF2F_DB_URL
+from MCF2Flash.commons.net_io import SimpleRedis
+from MCF2Flash.app_config import MCF2F_DB_URL, CELERY_BROKER_URL, MCF2F_DISPATCH_DEBOUNCE
 
 logger = logging.getLogger(__name__)
 
+# 已经有run_tasks_not_done在排队等待执行时存在此key，避免每个新任务都触发一次调度
+DISPATCH_PENDING_KEY = 'mcf_v2:dispatch_pending'
+# key的兜底过期时间，防止触发消息丢失后一直无法再次触发
+DISPATCH_PENDING_TTL = 300
+
 
 @celery_app.task(name="init_browser")
 def init_browser():
@@ -31,7 +37,35 @@ def dispose_browser():
 def run_tasks_not_done():
     mcf = get_mcf()
     dao = UniversalDAO(MCF2F_DB_URL, logger)
+    # 开始认领前清除排队标记，执行期间到达的新任务会再触发一次调度
+    try:
+        SimpleRedis(CELERY_BROKER_URL).delete(DISPATCH_PENDING_KEY)
+    except Exception as e:
+        logger.warning(f"清除调度标记失败: {e}")
+    mcf.reap_idle_browsers()
     mcf.run_tasks_in_db_not_done(dao)
-    mcf.dispose()
+    # 浏览器保持存活供下一轮复用，空闲超时后由reap_idle_browsers关闭
     time.sleep(2)
     return True
+
+
+@celery_app.task(name="reap_idle_browsers", ignore_result=True)
+def reap_idle_browsers():
+    mcf = get_mcf()
+    return mcf.reap_idle_browsers()
+
+
+def notify_new_tasks() -> bool:
+    """
+    新任务入库后通知worker尽快开始执行，debounce窗口内的多次通知只会触发一次run_tasks_not_done
+    通知失败不影响任务入库，celery beat的定时扫描会兜底
+
+    :return: 是否新触发了一次调度
+    """
+    try:
+        if SimpleRedis(CELERY_BROKER_URL).set_if_absent(DISPATCH_PENDING_KEY, 1, DISPATCH_PENDING_TTL):
+            run_tasks_not_done.apply_async(countdown=MCF2F_DISPATCH_DEBOUNCE)
+            return True
+    except Exception as e:
+        logger.warning(f"触发任务调度失败，等待定时扫描: {e}")
+    return False
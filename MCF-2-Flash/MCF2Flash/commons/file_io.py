@@ -1,6 +1,13 @@
+import copy
 import json
+import os
+import threading
+
 import yaml
 
+# 优先使用libyaml提供的C实现，语义与FullLoader一致
+_YAML_LOADER = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
 def yaml_loader(path: str, encoding: str = 'utf-8') -> dict:
     """用于减少yaml配置文件读取的重复代码
 
@@ -10,12 +17,81 @@ def yaml_loader(path: str, encoding: str = 'utf-8') -> dict:
     """
     try:
         with open(path, 'r', encoding=encoding) as f:
-            return yaml.load(f, yaml.FullLoader)
+            return yaml.load(f, _YAML_LOADER)
     except Exception as e:
         print(e)
         return {}
 
 
+class YamlTemplateCache(object):
+    """
+    按文件路径缓存解析后的yaml，文件的mtime或大小变化后自动重新解析
+    每次返回的都是深拷贝，调用方可以随意修改而不会污染缓存
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self.encoding = encoding
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path: str) -> dict:
+        """
+
+        :param path: 文件的路径
+        :return: 当加载成功，返回有元素的dict，否则返回空dict
+        """
+        try:
+            st = os.stat(path)
+        except Exception as e:
+            print(e)
+            return {}
+        version = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._cache.get(path, None)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+
+        parsed = yaml_loader(path, encoding=self.encoding)
+        with self._lock:
+            self._cache[path] = (version, parsed)
+        return copy.deepcopy(parsed)
+
+    def invalidate(self, path: str = None):
+        """
+        清除指定路径的缓存，不指定则全部清除
+
+        :param path:
+        :return:
+        """
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(path, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache)}
+
+
+# 进程内共享的模板缓存
+template_cache = YamlTemplateCache()
+
+
+def cached_yaml_loader(path: str) -> dict:
+    """带缓存的yaml_loader，适用于会被反复读取的插件参数模板
+
+    :param path: 文件的路径
+    :return: 当加载成功，返回有元素的dict，否则返回空dict
+    """
+    return template_cache.load(path)
+
+
 def yaml_writer(path: str, content: dict, encoding: str = 'utf-8') -> bool:
     """用于减少yaml配置文件输出的重复代码
 
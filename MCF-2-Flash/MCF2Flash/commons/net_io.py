@@ -1,9 +1,79 @@
+import asyncio
+import threading
+import weakref
+
 import redis
+import redis.asyncio as aioredis
+
+# 进程内按url共享的连接池
+_POOLS = {}
+# asyncio连接池只能在创建它的事件循环中使用，因此按事件循环分别共享：{loop: {url: pool}}，事件循环被回收后随之释放
+_ASYNC_POOLS = weakref.WeakKeyDictionary()
+_POOLS_LOCK = threading.Lock()
+
+
+def get_redis_pool(url: str) -> redis.ConnectionPool:
+    """
+    获取url对应的进程级连接池，同一个url只会创建一次
+
+    :param url: redis://HOST:PORT/DB
+    :return:
+    """
+    pool = _POOLS.get(url, None)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(url, None)
+            if pool is None:
+                pool = redis.ConnectionPool.from_url(url, decode_responses=True)
+                _POOLS[url] = pool
+    return pool
+
+
+def get_async_redis_pool(url: str) -> aioredis.ConnectionPool:
+    """
+    获取url在当前事件循环中的asyncio连接池，供FastAPI等异步代码使用，需要在事件循环中调用
+
+    :param url: redis://HOST:PORT/DB
+    :return:
+    """
+    loop = asyncio.get_running_loop()
+    with _POOLS_LOCK:
+        pools = _ASYNC_POOLS.setdefault(loop, {})
+        pool = pools.get(url, None)
+        if pool is None:
+            pool = aioredis.ConnectionPool.from_url(url, decode_responses=True)
+            pools[url] = pool
+    return pool
+
+
+def close_redis_pools():
+    """
+    断开所有同步连接池中的连接，通常在进程退出或fork之后调用
+
+    :return:
+    """
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.disconnect()
+
+
+async def close_async_redis_pools():
+    """
+    断开当前事件循环中所有asyncio连接池的连接，在事件循环结束前（例如FastAPI shutdown时）调用
+
+    :return:
+    """
+    with _POOLS_LOCK:
+        pools = list(_ASYNC_POOLS.pop(asyncio.get_running_loop(), {}).values())
+    for pool in pools:
+        await pool.disconnect()
 
 
 class SimpleRedis:
     """
-    极简 Redis 客户端封装
+    极简 Redis 客户端封装，同一url的实例共享连接池，可以随用随建
     用法：
         r = SimpleRedis("127.0.0.1:6379/0")
         r.set("foo", "bar")
@@ -11,11 +81,8 @@ class SimpleRedis:
     """
 
     def __init__(self, url: str):
-        # 直接让 redis-py 解析完整 URL
-        self._cli = redis.Redis.from_url(
-            url,
-            decode_responses=True  # 仍保持返回 str
-        )
+        # 直接让 redis-py 解析完整 URL，仍保持返回 str
+        self._cli = redis.Redis(connection_pool=get_redis_pool(url))
 
     # 写数据
     def set(self, key, value, expire_time=None):
@@ -29,10 +96,61 @@ class SimpleRedis:
         """
         return self._cli.set(key, value, ex=expire_time)
 
+    def set_if_absent(self, key, value, expire_time=None) -> bool:
+        """
+        仅当key不存在时设置值，可用于简单的去重/防抖
+
+        :param key:
+        :param value:
+        :param expire_time: 过期时间（单位为秒）
+        :return: 是否设置成功
+        """
+        return bool(self._cli.set(key, value, ex=expire_time, nx=True))
+
+    def mset(self, mapping: dict, expire_time=None):
+        """
+        一次往返写入多个key，指定过期时间时在同一个事务中为每个key设置过期
+
+        :param mapping: {key: value}
+        :param expire_time: 过期时间（单位为秒）
+        :return:
+        """
+        if not mapping:
+            return True
+        if expire_time is None:
+            return self._cli.mset(mapping)
+        with self._cli.pipeline(transaction=True) as pipe:
+            for k, v in mapping.items():
+                pipe.set(k, v, ex=expire_time)
+            return all(pipe.execute())
+
+    def pipeline(self, transaction: bool = True):
+        """
+        返回redis-py的pipeline，用于自定义的批量写入，例如：
+            with r.pipeline() as pipe:
+                pipe.set('a', 1).expire('a', 60).rpush('q', 'x')
+                pipe.execute()
+
+        :param transaction: 是否以MULTI/EXEC事务执行
+        :return:
+        """
+        return self._cli.pipeline(transaction=transaction)
+
     # 读数据
     def get(self, key):
         return self._cli.get(key)
 
+    def mget(self, *keys) -> list:
+        """
+        一次往返读取多个key，不存在的key返回None
+
+        :param keys:
+        :return:
+        """
+        if not keys:
+            return []
+        return self._cli.mget(keys)
+
     # 按需扩展
     def delete(self, *keys):
         return self._cli.delete(*keys)
@@ -41,5 +159,55 @@ class SimpleRedis:
         return bool(self._cli.exists(key))
 
 
+class AsyncSimpleRedis:
+    """
+    SimpleRedis的asyncio版本，接口保持一致
+    用法：
+        r = AsyncSimpleRedis("redis://127.0.0.1:6379/0")
+        await r.set("foo", "bar")
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+
+    @property
+    def _cli(self) -> aioredis.Redis:
+        # 每次使用时按当前事件循环取连接池，实例可以在事件循环之外创建，也可以跨多个事件循环使用
+        return aioredis.Redis(connection_pool=get_async_redis_pool(self.url))
+
+    async def set(self, key, value, expire_time=None):
+        return await self._cli.set(key, value, ex=expire_time)
+
+    async def set_if_absent(self, key, value, expire_time=None) -> bool:
+        return bool(await self._cli.set(key, value, ex=expire_time, nx=True))
+
+    async def mset(self, mapping: dict, expire_time=None):
+        if not mapping:
+            return True
+        if expire_time is None:
+            return await self._cli.mset(mapping)
+        async with self._cli.pipeline(transaction=True) as pipe:
+            for k, v in mapping.items():
+                pipe.set(k, v, ex=expire_time)
+            return all(await pipe.execute())
+
+    def pipeline(self, transaction: bool = True):
+        return self._cli.pipeline(transaction=transaction)
+
+    async def get(self, key):
+        return await self._cli.get(key)
+
+    async def mget(self, *keys) -> list:
+        if not keys:
+            return []
+        return await self._cli.mget(keys)
+
+    async def delete(self, *keys):
+        return await self._cli.delete(*keys)
+
+    async def exists(self, key):
+        return bool(await self._cli.exists(key))
+
+
 if __name__ == '__main__':
     r = SimpleRedis("192.168.81.134:6379/1")
@@ -2,26 +2,25 @@ import uuid
 
 import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from loguru import logger
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.exc import NoResultFound
 
-import MCF2Flash.repository.defined_repositories as dr
-from MCF2Flash.celery_misc.mcf_v2_tasks import init_browser as ib, dispose_browser as db, run_tasks_not_done
+import MCF2Flash.repository.async_repositories as adr
+from MCF2Flash.celery_misc.mcf_v2_tasks import init_browser as ib, dispose_browser as db, run_tasks_not_done, \
+    notify_new_tasks
 from MCF2Flash.domains.defined_domains import SingleTaskReceive, BulkTasksReceive, TaskRowCreate, \
     SingleTaskReceiveSpecial
-from MCF2Flash.fastapi_depends import SessionLocal, get_namespace_common, get_driver_mgmt
+from MCF2Flash.fastapi_depends import AsyncSessionLocal, get_namespace_common, get_driver_mgmt
 from MCF2Flash.commons.v2_abstract_extension import TaskListV2DataForExtensions, AbstractExtensionMCFV2
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @router.get("/mcf/v2/init_browser", tags=['MCF2Flash'])
@@ -37,7 +36,7 @@ def dispose_browser():
 
 
 @router.post("/mcf/v2/tasks/single/special", tags=['tasks'])
-def receive_task_special(task: SingleTaskReceiveSpecial, db: Session = Depends(get_db)):
+async def receive_task_special(task: SingleTaskReceiveSpecial, db: AsyncSession = Depends(get_async_db)):
     """
     适用于特殊任务的一次性提交
 
@@ -47,7 +46,7 @@ def receive_task_special(task: SingleTaskReceiveSpecial, db: Session = Depends(g
     """
     logger.info(f"Received task: {task.url}")
 
-    exists_tasks = dr.get_same_special_tasks(db, task)
+    exists_tasks = await adr.get_same_special_tasks(db, task)
     exists_tasks = [i.to_dict() for i in exists_tasks]
 
     NO_SAME_TASKS = True
@@ -74,19 +73,21 @@ def receive_task_special(task: SingleTaskReceiveSpecial, db: Session = Depends(g
     if NO_SAME_TASKS:
         created_task = TaskRowCreate(task_uid=str(uuid.uuid4()), task_content=task.url, task_status=3,
                                      driver_info=task.driver, extra_content=task.extra_content)
-        status = dr.create_task(db, created_task)
+        status = await adr.create_task(db, created_task)
+        await run_in_threadpool(notify_new_tasks)
         total_status = status
         return {'status': total_status}
     else:
         created_task = TaskRowCreate(task_uid=str(uuid.uuid4()), task_content=task.url, task_status=3,
                                      driver_info=task.driver, extra_content=task.extra_content)
-        status = dr.create_task(db, created_task)
+        status = await adr.create_task(db, created_task)
+        await run_in_threadpool(notify_new_tasks)
         total_status = status
         return {'status': total_status, "msg": f"任务: ({task}) 已存在，尝试再进入队列处理增量内容"}
 
 
 @router.post("/mcf/v2/tasks/single/", tags=['tasks'])
-def receive_task(task: SingleTaskReceive, db: Session = Depends(get_db)):
+async def receive_task(task: SingleTaskReceive, db: AsyncSession = Depends(get_async_db)):
     """
     常规批量任务单个发送
 
@@ -100,7 +101,7 @@ def receive_task(task: SingleTaskReceive, db: Session = Depends(get_db)):
     for info in driver_info:
         driver_full_name = info['driver']
 
-        exists_tasks = dr.get_tasks_by_content(db, task.url, driver_full_name)
+        exists_tasks = await adr.get_tasks_by_content(db, task.url, driver_full_name)
         exists_tasks = [i.to_dict() for i in exists_tasks]
 
         NO_SAME_TASKS = True
@@ -127,7 +128,8 @@ def receive_task(task: SingleTaskReceive, db: Session = Depends(get_db)):
         if NO_SAME_TASKS:
             created_task = TaskRowCreate(task_uid=str(uuid.uuid4()), task_content=task.url, task_status=3,
                                          driver_info=driver_full_name)
-            status = dr.create_task(db, created_task)
+            status = await adr.create_task(db, created_task)
+            await run_in_threadpool(notify_new_tasks)
             total_status = status
             return {'status': total_status}
         else:
@@ -135,7 +137,7 @@ def receive_task(task: SingleTaskReceive, db: Session = Depends(get_db)):
 
 
 @router.post("/mcf/v2/tasks/bulk/", tags=['tasks'])
-def receive_tasks_bulk(tasks: BulkTasksReceive, db: Session = Depends(get_db)):
+async def receive_tasks_bulk(tasks: BulkTasksReceive, db: AsyncSession = Depends(get_async_db)):
     """
     常规批量任务批量发送
 
@@ -155,7 +157,7 @@ def receive_tasks_bulk(tasks: BulkTasksReceive, db: Session = Depends(get_db)):
         for info in driver_info:
             driver_full_name = info['driver']
 
-            exists_tasks = dr.get_tasks_by_content(db, url, driver_full_name)
+            exists_tasks = await adr.get_tasks_by_content(db, url, driver_full_name)
             exists_tasks = [i.to_dict() for i in exists_tasks]
 
             NO_SAME_TASKS = True
@@ -183,26 +185,28 @@ def receive_tasks_bulk(tasks: BulkTasksReceive, db: Session = Depends(get_db)):
                 created_task = TaskRowCreate(task_uid=str(uuid.uuid4()), task_content=url, task_status=3,
                                              driver_info=driver_full_name,
                                              download_dir=params.get('download_child_dir', None))
-                status = dr.create_task(db, created_task)
+                status = await adr.create_task(db, created_task)
                 add_urls.append(url)
                 urls_with_status.append({'url': url, 'status': status})
             else:
                 urls_with_status.append({'url': url, 'status': False, "msg": f"任务: ({url}) 已存在，拒绝再次添加为Bulk任务成员"})
 
+    if len(add_urls) > 0:
+        await run_in_threadpool(notify_new_tasks)
     return {'status': urls_with_status}
 
 
 @router.get('/mcf/v2/tasks/{uid}', tags=['tasks'])
-def get_single_task(uid: str, db: Session = Depends(get_db)):
+async def get_single_task(uid: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        return dr.get_task_by_uid(db, uid)
+        return await adr.get_task_by_uid(db, uid)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Item not found")
 
 
 @router.get('/mcf/v2/tasks/status/', tags=['tasks'])
-def get_tasks_by_status(code: int, db: Session = Depends(get_db)):
-    return dr.get_tasks_by_status(db, code)
+async def get_tasks_by_status(code: int, db: AsyncSession = Depends(get_async_db)):
+    return await adr.get_tasks_by_status(db, code)
 
 
 @router.post('/mcf/v2/tasks/run_not_done', tags=['tasks'])
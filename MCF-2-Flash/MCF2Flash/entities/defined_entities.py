@@ -35,11 +35,14 @@ class TasksListV2(BaseMixin, Dec_Base):
     driver_info   = Column(String(50),  nullable=True, comment='驱动信息')
     download_dir  = Column(String(100), nullable=True, comment='下载目录')
     extra_content = Column(Text,        nullable=True, comment='额外内容')
+    claimed_by    = Column(String(100), nullable=True, comment='认领该任务的worker标识')
+    lease_expires_at = Column(DateTime, nullable=True, comment='任务认领租约的到期时间')
     # 表级配置：字符集、排序规则、存储引擎、注释、索引
     __table_args__ = (
         Index('idx_task_content', 'task_content'),
         Index('idx_task_status',  'task_status'),
         Index('idx_task_uid',     'task_uid'),
+        Index('idx_task_claimed_by', 'claimed_by'),
         {
             'mysql_charset': 'utf8mb4',
             'mysql_collate': 'utf8mb4_general_ci',
@@ -1,10 +1,11 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from MCF2Flash.commons.v2_abstract_extension import AbstractExtensionNameSpaceCommon
 from MCF2Flash.mcf_2f.mcf_2f_core import DriverMgmt
-from MCF2Flash.app_config import MCF2F_DB_URL, SQLALCHEMY_ECHO, MCF2F_CONFIG
+from MCF2Flash.app_config import MCF2F_DB_URL, SQLALCHEMY_ECHO, MCF2F_CONFIG, MCF2F_ASYNC_DB_URL
 
 # SQLite
 # engine = create_engine(
@@ -22,6 +23,17 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Mysql asyncio，供async def的路由使用，等待数据库时不占用线程池
+async_engine = create_async_engine(
+    MCF2F_ASYNC_DB_URL,
+    echo=bool(SQLALCHEMY_ECHO),
+    pool_recycle=3600,
+    pool_pre_ping=True
+)
+
+# expire_on_commit=False：提交后仍可直接读取实体属性，避免在异步上下文中触发隐式IO
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Dec_Base = declarative_base()
 driver_mgmt_instance = DriverMgmt(MCF2F_CONFIG)
 
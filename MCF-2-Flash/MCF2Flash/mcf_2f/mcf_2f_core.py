@@ -1,27 +1,33 @@
 import os
+import copy
 import subprocess
 import sys
 import pathlib
+import threading
+import time
 import traceback
+from contextlib import contextmanager
 from time import sleep
 
 import pandas as pd
-from typing import Any, List, Union
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
 
 import psutil
 from seleniumbase import Driver, SB
 from seleniumbase.core import browser_launcher
-from sqlalchemy import text
 
 t = pathlib.Path(__file__).parent.resolve()
 sys.path.append("..")
 sys.path.append(str(t))
 from MCF2Flash.commons.v2_abstract_extension import TaskListV2DataForExtensions, AbstractExtensionMCFV2
-from MCF2Flash.commons.file_io import yaml_loader
+from MCF2Flash.commons.file_io import yaml_loader, cached_yaml_loader, template_cache
 from MCF2Flash.commons.udao import UniversalDAO
 from MCF2Flash.commons.net_io import SimpleRedis
 from MCF2Flash.mcf_2f.extension_mgr import ExtLoader
+from MCF2Flash.mcf_2f.parallel_executor import ParallelBrowserExecutor
 from MCF2Flash.mcf_2f.selenium_core import SBOmniWrapper
+from MCF2Flash.mcf_2f.task_batch import TaskBatch, AdaptiveSubBatchSizer, group_task_batches, hydrate_batches
+from MCF2Flash.mcf_2f.task_store import TaskClaimer, TaskCompletionWriter, default_worker_id
 
 
 class DriverMgmt(object):
@@ -37,13 +43,27 @@ class DriverMgmt(object):
 
 
 class MCF2FlashCore(object):
-    def __init__(self, logger: Any, main_config_path: str):
+    # UC模式启动时会改写chromedriver，多个浏览器同时启动会互相干扰，因此启动过程串行化
+    _browser_launch_lock = threading.Lock()
+
+    def __init__(self, logger: Any, main_config_path: str, slot_index: int = 0):
+        """
+
+        :param logger:
+        :param main_config_path: 主配置文件路径
+        :param slot_index: 并行模式下的浏览器槽位编号，0为主实例，其余槽位会使用独立的用户数据目录和vnc端口
+        """
         self.logger = logger
+        self.main_config_path = main_config_path
+        self.slot_index = slot_index
 
         if os.path.exists(main_config_path) and os.path.isfile(main_config_path):
             self.config: dict = yaml_loader(main_config_path, encoding='utf-8')
         else:
             raise FileNotFoundError(main_config_path)
+        self.selenium_config: dict = copy.deepcopy(self.config['Selenium'])
+        if slot_index > 0 and self.selenium_config.get('user_data_dir', None):
+            self.selenium_config['user_data_dir'] = f"{self.selenium_config['user_data_dir']}_{slot_index}"
         self.sb_manager = None
         self.sb: SB = None
         self.driver: Driver = None
@@ -66,8 +86,8 @@ class MCF2FlashCore(object):
         # 运行环境
         self.xvfb = self.config.get('Selenium', {}).get('xvfb', False)
         self.xvfb_display: int = -1
-        self.vnc_port = self.config.get('Environment', {}).get('vnc_port', 5911)
-        self.novnc_port = self.config.get('Environment', {}).get('novnc_port', 9101)
+        self.vnc_port = self.config.get('Environment', {}).get('vnc_port', 5911) + slot_index
+        self.novnc_port = self.config.get('Environment', {}).get('novnc_port', 9101) + slot_index
         self.x11vnc_proc = None
         self.novnc_proc = None
 
@@ -81,12 +101,40 @@ class MCF2FlashCore(object):
                                         self.extension_config['ByExtensions'].items()}
         self.dynamic_load_from = {ext_n: ext.get('dynamic_load_from', None) for ext_n, ext in
                                   self.extension_config['ByExtensions'].items()}
+        self.extension_concurrency = {ext_n: int(ext.get('max_concurrency', 1) or 1) for ext_n, ext in
+                                      self.extension_config['ByExtensions'].items()}
+        for ext_n, ext in self.extension_config['ByExtensions'].items():
+            # 让允许并发的插件知道当前槽位应该从哪个redis key读取任务清单
+            ext['redis_task_key'] = self.redis_task_key(ext_n)
+
+        # 执行模式，serial为单浏览器顺序执行，parallel为多浏览器并行执行
+        self.executor_mode = self.config['Common'].get('executor', 'serial')
+        self.max_workers = int(self.config['Common'].get('max_workers', 1) or 1)
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        # 可合并插件的子批次大小，按插件分别根据观测耗时调整
+        self._sub_batch_sizers = {}
+
+        # 浏览器保活：空闲超过browser_idle_ttl秒后关闭，累计执行browser_recycle_after_tasks个任务后重启，0表示不限制
+        self.browser_idle_ttl = int(self.config['Common'].get('browser_idle_ttl', 600))
+        self.browser_recycle_after_tasks = int(self.config['Common'].get('browser_recycle_after_tasks', 0))
+        self.browser_last_used_at: float = 0.0
+        self.tasks_since_launch: int = 0
+
+        # 任务认领，多个worker可以共享同一张tasks_list_v2
+        self.worker_id = default_worker_id()
+        self.claim_batch_size = int(self.config['Common'].get('claim_batch_size', 500))
+        self.task_lease_seconds = int(self.config['Common'].get('task_lease_seconds', 3600))
+        # 已完成任务的批量写入阈值：数量与等待秒数
+        self.completion_flush_size = int(self.config['Common'].get('completion_flush_size', 100))
+        self.completion_flush_interval = float(self.config['Common'].get('completion_flush_interval', 5))
 
         self.running_lock = False
 
     def init_browser(self):
         if self.sb_manager is None:
-            self.sb_manager = SBOmniWrapper(**self.config['Selenium'])
+            with self._browser_launch_lock:
+                self.sb_manager = SBOmniWrapper(**self.selenium_config)
             if self.xvfb:
                 if self.sb_manager.sb.xvfb:
                     # 通过启用SB的xvfb参数来实现xvfb，然后通过他的自定义的pyvirtualdisplay来获取xvfb的display编号，从而实现vnc转发
@@ -94,10 +142,71 @@ class MCF2FlashCore(object):
                     self.start_novnc()
             self.sb = self.sb_manager.sb
             self.driver = self.sb_manager.driver
+            self.browser_last_used_at = time.time()
+            self.tasks_since_launch = 0
         else:
             self.logger.warning("Browser already initialized!")
 
-    def dispose(self):
+    def is_browser_alive(self) -> bool:
+        """
+        检查浏览器是否仍可用。UC模式下插件可能主动断开了driver，此时先尝试重连
+
+        :return:
+        """
+        if self.driver is None:
+            return False
+        try:
+            is_connected = getattr(self.driver, 'is_connected', None)
+            if is_connected is not None and not is_connected():
+                self.driver.connect()
+            _ = self.driver.window_handles
+            return True
+        except Exception as _:
+            return False
+
+    def ensure_browser(self):
+        """
+        复用已启动的浏览器，只有在浏览器失去响应或执行任务数达到回收阈值时才重启
+
+        :return:
+        """
+        if self.sb_manager is not None:
+            reason = None
+            if 0 < self.browser_recycle_after_tasks <= self.tasks_since_launch:
+                reason = f"已执行{self.tasks_since_launch}个任务"
+            elif not self.is_browser_alive():
+                reason = "浏览器已失去响应"
+            if reason:
+                self.logger.info(f"回收浏览器槽位{self.slot_index}: {reason}")
+                self.dispose_browser()
+        if self.sb_manager is None:
+            self.init_browser()
+
+    def reap_idle_browsers(self) -> int:
+        """
+        关闭空闲时间超过browser_idle_ttl的浏览器（包括并行模式下的其他槽位），任务执行期间不做处理
+
+        :return: 被关闭的浏览器数量
+        """
+        if self.running_lock or self.browser_idle_ttl <= 0:
+            return 0
+        with self._slots_lock:
+            slots = [self] + list(self._slots.values())
+        reaped = 0
+        now = time.time()
+        for slot in slots:
+            if slot.sb_manager is not None and now - slot.browser_last_used_at > self.browser_idle_ttl:
+                self.logger.info(f"浏览器槽位{slot.slot_index}已空闲{int(now - slot.browser_last_used_at)}秒，关闭浏览器")
+                slot.dispose_browser()
+                reaped += 1
+        return reaped
+
+    def dispose_browser(self):
+        """
+        只关闭当前槽位的浏览器及其vnc转发
+
+        :return:
+        """
         if self.sb_manager is not None:
             self.sb_manager.dispose()
         self.sb = None
@@ -106,6 +215,14 @@ class MCF2FlashCore(object):
 
         self.stop_novnc()
 
+    def dispose(self):
+        self.dispose_browser()
+
+        with self._slots_lock:
+            slots, self._slots = self._slots, {}
+        for slot in slots.values():
+            slot.dispose()
+
     def stop_novnc(self):
         if self.novnc_proc:
             try:
@@ -119,6 +236,7 @@ class MCF2FlashCore(object):
             except Exception as _:
                 pass
             self.novnc_proc.terminate()
+            self.novnc_proc = None
 
         if self.x11vnc_proc:
             try:
@@ -132,6 +250,7 @@ class MCF2FlashCore(object):
             except Exception as _:
                 pass
             self.x11vnc_proc.terminate()
+            self.x11vnc_proc = None
 
     def start_novnc(self) -> bool:
         logger = self.logger
@@ -227,178 +346,254 @@ class MCF2FlashCore(object):
                     results_by_ext[ext] = None
             return results_by_ext
 
-    def run_tasks_in_db_not_done(self, dao: UniversalDAO) -> Any:
+    def build_task_batches(self, not_done_tasks: pd.DataFrame) -> Iterator[TaskBatch]:
+        """
+        按插件和下载目录把待执行任务切分为TaskBatch，非本namespace的任务会被忽略
+
+        :param not_done_tasks: tasks_list_v2中未完成的记录
+        :return: 惰性产出的TaskBatch
+        """
         ext_mgr = self.extension_loader
+
+        def is_mergeable(ext_name: str) -> bool:
+            extension: AbstractExtensionMCFV2 = ext_mgr[ext_name]
+            return extension.can_merge_multiple_to_one_batch()
+
+        return group_task_batches(not_done_tasks, self.extension_ns, is_mergeable)
+
+    def redis_task_key(self, ext_name: str) -> str:
+        """
+        插件读取任务清单所用的redis key。并发上限为1的插件沿用插件名作为key，
+        允许多浏览器并发的插件则按槽位区分key，并通过配置中的redis_task_key告知插件
+
+        :param ext_name:
+        :return:
+        """
+        if self.extension_concurrency.get(ext_name, 1) > 1:
+            return f"{ext_name}:{self.slot_index}"
+        return ext_name
+
+    @contextmanager
+    def _lease_heartbeat(self, renew: Optional[Callable[[], Any]]):
+        """
+        插件执行期间每隔task_lease_seconds/3秒调用一次renew续期租约，避免单次执行超过租约时长后任务被其他worker重新认领
+
+        :param renew: 续期回调，为None时不启动心跳
+        :return:
+        """
+        if renew is None:
+            yield
+            return
+        stopped = threading.Event()
+        interval = max(1.0, self.task_lease_seconds / 3)
+
+        def beat():
+            while not stopped.wait(interval):
+                try:
+                    renew()
+                except Exception as _:
+                    self.logger.error(f"续期任务租约失败: {traceback.format_exc()}")
+
+        heartbeat = threading.Thread(target=beat, name=f"lease-heartbeat-{self.slot_index}", daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            heartbeat.join()
+
+    def _run_extension_once(self, ext_name: str, tasks: List[TaskListV2DataForExtensions],
+                            renew: Callable[[], Any] = None) -> Tuple[list, bool]:
+        """
+        把一组任务写入redis并执行一次插件
+
+        :param ext_name:
+        :param tasks:
+        :param renew: 插件执行期间定期调用的租约续期回调
+        :return: (插件返回的done_tasks, 插件是否执行成功)，执行失败时会尽量从插件收集已完成的部分
+        """
+        logger = self.logger
+        extension: AbstractExtensionMCFV2 = self.extension_loader[ext_name]
+
+        self.ensure_browser()
+
+        logger.info("调用插件解析队列任务")
+        tasks_list_template = extension.parse_tasklist_to_redis(
+            cached_yaml_loader(self.extension_template_path[ext_name]),
+            tasks)
+        redis_client = SimpleRedis(self.dynamic_load_from[ext_name])
+        redis_client.set(self.redis_task_key(ext_name), tasks_list_template)
+        logger.info("任务已保存至Redis")
+
+        r = None
+        succeed = True
+        try:
+            with self._lease_heartbeat(renew):
+                r = self._run_driver(ext_name)
+        except Exception:
+            succeed = False
+            logger.error(f"插件{ext_name}执行异常，将收集已完成的任务，跳过失败的任务")
+            try:
+                r = self.extension_loader.call(ext_name, "get_plugin_return")
+            except Exception as _:
+                logger.error(traceback.format_exc())
+        finally:
+            self.browser_last_used_at = time.time()
+            self.tasks_since_launch += len(tasks)
+        return list((r or {}).get('done_tasks', None) or []), succeed
+
+    def _sub_batch_sizer(self, ext_name: str) -> AdaptiveSubBatchSizer:
+        if ext_name not in self._sub_batch_sizers:
+            ext_config = self.extension_config['ByExtensions'].get(ext_name, {}) or {}
+            self._sub_batch_sizers[ext_name] = AdaptiveSubBatchSizer(
+                max_size=int(ext_config.get('sub_batch_size', 200)),
+                target_seconds=float(ext_config.get('sub_batch_seconds', 600)))
+        return self._sub_batch_sizers[ext_name]
+
+    def run_task_batch(self, batch: TaskBatch, on_progress: Callable[[list], None] = None,
+                       on_start: Callable[[list], list] = None) -> list:
+        """
+        在本实例的浏览器上执行一个TaskBatch
+        可合并插件的批次会被切分为子批次依次执行，每个子批次完成后立即通过on_progress汇报，
+        某个子批次失败后剩余的任务不再执行，留待下一轮调度
+
+        :param batch:
+        :param on_progress: 每个子批次执行完毕后以已完成任务的标识列表调用
+        :param on_start: 每个（子）批次执行前以尚未执行的任务id调用，返回仍可执行的任务id（用于续期租约），
+                         插件执行期间也会定期以同样的任务id调用
+        :return: 已完成任务的标识，可合并插件为插件返回的done_tasks，不可合并插件为task_uid
+        """
+        logger = self.logger
+        ext_name = batch.ext_name
+
+        if not batch.mergeable:
+            if on_start is not None and len(on_start(batch.task_ids)) == 0:
+                return []
+            renew = None if on_start is None else (lambda: on_start(batch.task_ids))
+            done_tasks, _ = self._run_extension_once(ext_name, batch.tasks, renew)
+            # 不可合并任务使用task_uid来标记任务完成情况
+            done_tasks = [task.task_uid for task in batch.tasks] if len(done_tasks) > 0 else []
+            if on_progress is not None and len(done_tasks) > 0:
+                on_progress(done_tasks)
+            return done_tasks
+
+        sizer = self._sub_batch_sizer(ext_name)
+        all_done_tasks = []
+        remaining = list(zip(batch.task_ids, batch.tasks))
+        finished = 0
+        while len(remaining) > 0:
+            if on_start is not None:
+                # 为剩余的全部任务续期，长时间运行的批次中排在后面的任务不会因租约过期被其他worker认领
+                owned = set(on_start([task_id for task_id, _ in remaining]))
+                remaining = [(task_id, task) for task_id, task in remaining if task_id in owned]
+                if len(remaining) == 0:
+                    break
+            # 执行期间的心跳为当前子批次和排在其后的任务续期
+            pending_ids = [task_id for task_id, _ in remaining]
+            sub_tasks = [task for _, task in remaining[:sizer.next_size()]]
+            remaining = remaining[len(sub_tasks):]
+            # 先确保浏览器可用再计时，浏览器冷启动的耗时不计入单任务耗时
+            self.ensure_browser()
+            started_at = time.time()
+            renew = None if on_start is None else (lambda ids=pending_ids: on_start(ids))
+            done_tasks, succeed = self._run_extension_once(ext_name, sub_tasks, renew)
+            sizer.observe(len(sub_tasks), time.time() - started_at)
+            finished += len(sub_tasks)
+            logger.info(f"{batch.describe()} 子批次完成{len(done_tasks)}/{len(sub_tasks)}个任务，进度{finished}/{len(batch)}")
+
+            all_done_tasks.extend(done_tasks)
+            if on_progress is not None and len(done_tasks) > 0:
+                on_progress(done_tasks)
+            if not succeed:
+                if len(remaining) > 0:
+                    logger.warning(f"插件{ext_name}子批次执行失败，剩余{len(remaining)}个任务留待下一轮执行")
+                break
+        return all_done_tasks
+
+    def get_slot(self, slot_index: int) -> 'MCF2FlashCore':
+        """
+        获取并行模式下的浏览器槽位，0号槽位即当前实例，其余槽位按需创建并复用
+
+        :param slot_index:
+        :return:
+        """
+        if slot_index == 0:
+            return self
+        with self._slots_lock:
+            if slot_index not in self._slots:
+                self._slots[slot_index] = MCF2FlashCore(self.logger, self.main_config_path, slot_index=slot_index)
+            return self._slots[slot_index]
+
+    def _execute_tasks(self, not_done_tasks: pd.DataFrame, claimer: TaskClaimer, writer: TaskCompletionWriter):
+        """
+        切分并执行一批已认领的任务，完成的任务交给writer批量标记为DONE
+
+        :param not_done_tasks:
+        :param claimer: 用于在批次执行前按需读取extra_content，并在执行前续期租约
+        :param writer:
+        :return:
+        """
+        logger = self.logger
+        batches = self.build_task_batches(not_done_tasks)
+        hydrated_batches = hydrate_batches(batches, claimer.load_extra_content)
+
+        def on_progress(batch: TaskBatch, done_tasks: list):
+            # 可合并插件的子批次完成后立即落库，避免后续失败丢失已完成的工作
+            writer.add(done_tasks, flush_now=batch.mergeable)
+
+        if self.executor_mode == 'parallel' and self.max_workers > 1:
+            logger.info(f"使用最多{self.max_workers}个浏览器并行执行任务批次")
+            executor = ParallelBrowserExecutor(logger, self.max_workers, self.get_slot, self.extension_concurrency)
+            executor.run(hydrated_batches, on_progress, on_start=claimer.renew_lease)
+        else:
+            for batch in hydrated_batches:
+                logger.info(f"开始执行 {batch.describe()}")
+                self.run_task_batch(batch, on_progress=lambda done_tasks, b=batch: on_progress(b, done_tasks),
+                                    on_start=claimer.renew_lease)
+                logger.info(f"{batch.describe()} 执行完毕\n")
+
+    def run_tasks_in_db_not_done(self, dao: UniversalDAO) -> Any:
+        """
+        分批认领并执行tasks_list_v2中的PENDING任务，直到没有可认领的任务为止
+        本轮未完成的任务会在结束时退回PENDING
+
+        :param dao:
+        :return: 没有任务时返回None，否则返回True
+        """
         logger = self.logger
-        extension_template_path = self.extension_template_path
-        dynamic_load_from = self.dynamic_load_from
 
         if self.running_lock:
             logger.warning("Running tasks is locked! Skip this job for now")
             return None
 
-        logger.info("连接到数据库")
-        dao.connect()
-        not_done_tasks: pd.DataFrame = pd.read_sql(
-            "select * from tasks_list_v2 tl where task_status = 3",
-            dao.session.bind)
-        if 'extra_content' not in not_done_tasks.columns:
-            not_done_tasks['extra_content'] = None
-        not_done_tasks = not_done_tasks[['id', 'created_at', 'updated_at', 'deleted_at', 'task_uid',
-                                         'task_content', 'task_status', 'driver_info',
-                                         'download_dir', 'extra_content']]
-        if len(not_done_tasks) == 0:
-            dao.disconnect()
-            logger.info("No tasks to run!")
-            return None
-        else:
-            logger.info(f"Found {len(not_done_tasks)} tasks to run!")
-            dao.disconnect()
-            self.running_lock = True
+        self.running_lock = True
+        claimer = TaskClaimer(dao, logger, self.worker_id, self.task_lease_seconds)
+        writer = TaskCompletionWriter(dao, logger, self.completion_flush_size, self.completion_flush_interval)
+        total_claimed = 0
+        try:
+            logger.info("连接到数据库")
+            for not_done_tasks in claimer.iter_claimed_pages(self.claim_batch_size):
+                total_claimed += len(not_done_tasks)
+                logger.info(f"Worker {self.worker_id} claimed {len(not_done_tasks)} tasks to run!")
+                self._execute_tasks(not_done_tasks, claimer, writer)
+
+            if total_claimed == 0:
+                logger.info("No tasks to run!")
+                return None
+            logger.info(f"所有任务执行完毕")
+            logger.info(f"插件参数模板缓存: {template_cache.stats()}")
+        except Exception as _:
+            logger.error(traceback.format_exc())
+        finally:
+            # 先写入已完成的任务，再退回未完成的任务
             try:
-                tasks_by_driver = {}
-                for driver in not_done_tasks['driver_info'].unique():
-                    driver_tasks = not_done_tasks[not_done_tasks['driver_info'] == driver]
-                    tasks_by_driver[driver] = driver_tasks
-
-                valid_drivers = [drn for drn in tasks_by_driver if drn.startswith(self.extension_ns)]
-
-                all_done_jobs = []
-
-                for drn in valid_drivers:
-                    ext_name = drn.split(':')[-1]
-                    extension: AbstractExtensionMCFV2 = ext_mgr[ext_name]
-                    rows: pd.DataFrame = tasks_by_driver[drn]
-
-                    # 是否拥有指定的子下载目录
-                    no_download_dir = rows[rows['download_dir'].isnull()].copy()
-                    with_download_dir = rows[rows['download_dir'].notnull()].copy()
-
-                    if extension.can_merge_multiple_to_one_batch():
-                        if len(no_download_dir) > 0:
-                            logger.info("开始执行 可合并子任务-无专门指定下载目录 的零散取数任务")
-
-                            if self.sb_manager is None:
-                                self.init_browser()
-
-                            tasks_list = TaskListV2DataForExtensions.from_pandas(no_download_dir)
-                            logger.info("调用插件解析队列任务")
-                            tasks_list_template = extension.parse_tasklist_to_redis(
-                                yaml_loader(extension_template_path[ext_name]),
-                                tasks_list)
-                            redis_client = SimpleRedis(dynamic_load_from[ext_name])
-                            redis_client.set(ext_name, tasks_list_template)
-                            logger.info("任务已保存至Redis")
-
-                            try:
-                                r = self._run_driver(ext_name)
-                            except Exception:
-                                logger.error(f"插件{ext_name}执行异常，将收集已完成的任务，跳过失败的任务")
-                            done_tasks = r.get('done_tasks', [])
-                            if len(done_tasks) > 0:
-                                all_done_jobs.extend(done_tasks)
-                            all_done_jobs = self.update_done_job_now(all_done_jobs, dao)
-                            logger.info("零散任务执行完毕\n")
-
-                        if len(with_download_dir) > 0:
-                            logger.info("开始执行 可合并子任务-有指定下载目录 的零散取数任务")
-
-                            if self.sb_manager is None:
-                                self.init_browser()
-
-                            for down_dir in with_download_dir['download_dir'].unique():
-                                tasks_list = TaskListV2DataForExtensions.from_pandas(
-                                    with_download_dir[with_download_dir['download_dir'] == down_dir])
-                                tasks_list_template = extension.parse_tasklist_to_redis(
-                                    yaml_loader(extension_template_path[ext_name]),
-                                    tasks_list)
-                                redis_client = SimpleRedis(dynamic_load_from[ext_name])
-                                redis_client.set(ext_name, tasks_list_template)
-                                logger.info("任务已保存至Redis")
-                                try:
-                                    r = self._run_driver(ext_name)
-                                except Exception:
-                                    logger.error(f"插件{ext_name}执行异常，将收集已完成的任务，跳过失败的任务")
-                                done_tasks = r.get('done_tasks', [])
-                                if len(done_tasks) > 0:
-                                    all_done_jobs.extend(done_tasks)
-                                all_done_jobs = self.update_done_job_now(all_done_jobs, dao)
-                                logger.info(f"指定下载目录为{down_dir}的任务执行完毕\n")
-                    else:
-                        if len(no_download_dir) > 0:
-                            logger.info("开始执行 不可合并子任务-无专门指定下载目录 的零散取数任务")
-
-                            if self.sb_manager is None:
-                                self.init_browser()
-
-                            tasks_list = TaskListV2DataForExtensions.from_pandas(no_download_dir)
-                            for task in tasks_list:
-                                # 不可合并任务使用task_uid来标记任务完成情况
-                                task_uid = task.task_uid
-                                logger.info("调用插件解析队列任务")
-                                tasks_list_template = extension.parse_tasklist_to_redis(
-                                    yaml_loader(extension_template_path[ext_name]),
-                                    [task])
-                                redis_client = SimpleRedis(dynamic_load_from[ext_name])
-                                redis_client.set(ext_name, tasks_list_template)
-                                logger.info("任务已保存至Redis")
-
-                                try:
-                                    r = self._run_driver(ext_name)
-                                except Exception:
-                                    logger.error(f"插件{ext_name}执行异常，将收集已完成的任务，跳过失败的任务")
-                                done_tasks = r.get('done_tasks', [])
-                                if len(done_tasks) > 0:
-                                    all_done_jobs.append(task_uid)
-                                all_done_jobs = self.update_done_job_now(all_done_jobs, dao)
-                                logger.info(f"零散任务 {task} 执行完毕\n")
-                        if len(with_download_dir) > 0:
-                            logger.info("开始执行 不可合并子任务-有指定下载目录 的零散取数任务")
-
-                            if self.sb_manager is None:
-                                self.init_browser()
-
-                            for down_dir in with_download_dir['download_dir'].unique():
-                                tasks_list = TaskListV2DataForExtensions.from_pandas(
-                                    with_download_dir[with_download_dir['download_dir'] == down_dir])
-                                for task in tasks_list:
-                                    task_uid = task.task_uid
-                                    tasks_list_template = extension.parse_tasklist_to_redis(
-                                        yaml_loader(extension_template_path[ext_name]),
-                                        [task])
-                                    redis_client = SimpleRedis(dynamic_load_from[ext_name])
-                                    redis_client.set(ext_name, tasks_list_template)
-                                    logger.info("任务已保存至Redis")
-                                    try:
-                                        r = self._run_driver(ext_name)
-                                    except Exception:
-                                        logger.error(f"插件{ext_name}执行异常，将收集已完成的任务，跳过失败的任务")
-                                    done_tasks = r.get('done_tasks', [])
-                                    if len(done_tasks) > 0:
-                                        all_done_jobs.append(task_uid)
-                                    all_done_jobs = self.update_done_job_now(all_done_jobs, dao)
-                                    logger.info(f"指定下载目录为{down_dir}的{task}任务执行完毕\n")
-
-                    logger.info(f"所有属于插件{drn}的任务执行完毕\n")
-                logger.info(f"所有任务执行完毕")
-
-                _ = self.update_done_job_now(all_done_jobs, dao)
+                writer.close()
+            except Exception as _:
+                logger.error(traceback.format_exc())
+            try:
+                claimer.release_unfinished()
             except Exception as _:
                 logger.error(traceback.format_exc())
-            finally:
-                dao.disconnect()
-                self.running_lock = False
-                return True
-
-    @staticmethod
-    def update_done_job_now(all_done_jobs: list[Any], dao: UniversalDAO) -> list[Any]:
-        if len(all_done_jobs) > 0:
-            done_content_stmt = ",".join([f"'{task_uid}'" for task_uid in all_done_jobs])
-            sql = f"update tasks_list_v2 set task_status = 1 where task_content in ({done_content_stmt}) or task_uid in ({done_content_stmt})"
-            dao.connect()
-            dao.session.execute(text(sql))
-            dao.session.commit()
             dao.disconnect()
-            return []
-        else:
-            return all_done_jobs
+            self.running_lock = False
+        return True
@@ -0,0 +1,142 @@
+import threading
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from MCF2Flash.mcf_2f.task_batch import TaskBatch
+
+
+class ParallelBrowserExecutor(object):
+    """
+    多浏览器并行执行器
+    每个工作线程独占一个浏览器槽位（slot，即一个拥有独立浏览器、用户数据目录和display的MCF2FlashCore），
+    从共享的TaskBatch队列中领取任务执行。同一插件同时运行的浏览器数量不会超过其并发上限
+    """
+
+    def __init__(self, logger: Any, max_workers: int, slot_factory: Callable[[int], Any],
+                 extension_concurrency: Optional[Dict[str, int]] = None):
+        """
+
+        :param logger:
+        :param max_workers: 同时运行的浏览器数量
+        :param slot_factory: 根据槽位编号返回对应的MCF2FlashCore实例
+        :param extension_concurrency: {插件名: 最大并发浏览器数}，未指定的插件默认为1
+        """
+        self.logger = logger
+        self.max_workers = max(1, int(max_workers))
+        self.slot_factory = slot_factory
+        self.extension_concurrency = extension_concurrency or {}
+
+        self._cond = threading.Condition()
+        # 从批次生成器取数时使用的锁，与_cond分开，避免取数期间的数据库读取阻塞其他线程
+        self._source_lock = threading.Lock()
+        self._running_by_ext = Counter()
+        self._deferred: List[TaskBatch] = []
+        self._source = None
+        self._exhausted = False
+
+    def _limit_of(self, ext_name: str) -> int:
+        return max(1, int(self.extension_concurrency.get(ext_name, 1) or 1))
+
+    def _has_capacity(self, batch: TaskBatch) -> bool:
+        return self._running_by_ext[batch.ext_name] < self._limit_of(batch.ext_name)
+
+    def _pull_source(self) -> Optional[TaskBatch]:
+        """
+        从批次生成器中取出下一个批次。生成器在取出时会按需读取extra_content等数据，
+        因此只持有_source_lock，不阻塞其他线程领取暂存的批次或释放并发计数
+
+        :return: 生成器耗尽时返回None
+        """
+        with self._source_lock:
+            if self._exhausted:
+                return None
+            try:
+                batch = next(self._source, None)
+            except Exception as _:
+                # 生成器抛出异常后即终止，已领取的批次继续执行完毕
+                self.logger.error(traceback.format_exc())
+                batch = None
+            if batch is None:
+                self._exhausted = True
+            return batch
+
+    def _next_batch(self) -> Optional[TaskBatch]:
+        """
+        领取下一个可执行的TaskBatch，插件并发已满的批次会被暂存，等待其他线程释放后再领取
+
+        :return: 没有剩余任务时返回None
+        """
+        while True:
+            with self._cond:
+                for i, batch in enumerate(self._deferred):
+                    if self._has_capacity(batch):
+                        del self._deferred[i]
+                        self._running_by_ext[batch.ext_name] += 1
+                        return batch
+                if self._exhausted:
+                    if len(self._deferred) == 0:
+                        return None
+                    self._cond.wait()
+                    continue
+
+            batch = self._pull_source()
+            with self._cond:
+                if batch is None:
+                    # 唤醒等待的线程，让它们重新判断是否已无任务
+                    self._cond.notify_all()
+                    continue
+                if self._has_capacity(batch):
+                    self._running_by_ext[batch.ext_name] += 1
+                    return batch
+                self._deferred.append(batch)
+
+    def _release(self, batch: TaskBatch):
+        with self._cond:
+            self._running_by_ext[batch.ext_name] -= 1
+            self._cond.notify_all()
+
+    def _worker(self, slot_index: int, on_progress: Callable[[TaskBatch, list], None],
+                on_start: Optional[Callable[[list], list]] = None):
+        logger = self.logger
+        slot = None
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                if slot is None:
+                    slot = self.slot_factory(slot_index)
+                logger.info(f"浏览器槽位{slot_index} 开始执行 {batch.describe()}")
+                slot.run_task_batch(batch, on_progress=lambda done_tasks, b=batch: on_progress(b, done_tasks),
+                                    on_start=on_start)
+                logger.info(f"浏览器槽位{slot_index} {batch.describe()} 执行完毕\n")
+            except Exception as _:
+                logger.error(f"浏览器槽位{slot_index} 执行{batch.describe()}失败")
+                logger.error(traceback.format_exc())
+            finally:
+                self._release(batch)
+        logger.info(f"浏览器槽位{slot_index} 已无可领取的任务")
+
+    def run(self, batches: Iterable[TaskBatch], on_progress: Callable[[TaskBatch, list], None],
+            on_start: Optional[Callable[[list], list]] = None):
+        """
+        并行执行全部TaskBatch，会阻塞到所有任务执行完毕
+
+        :param batches: 待执行的任务批次，可以是惰性生成器
+        :param on_progress: 批次（或其子批次）执行完毕后的回调，参数为(批次, 已完成任务的标识列表)，会在工作线程中被调用
+        :param on_start: 批次（或其子批次）执行前的回调，参数为尚未执行的任务id，返回仍可执行的任务id
+        :return:
+        """
+        self._source = iter(batches)
+        self._exhausted = False
+        self._deferred = []
+        self._running_by_ext = Counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='mcf_browser_slot') as pool:
+            futures = [pool.submit(self._worker, i, on_progress, on_start) for i in range(self.max_workers)]
+            wait(futures)
+        for f in futures:
+            if f.exception() is not None:
+                self.logger.error(f"浏览器槽位异常退出: {f.exception()}")
@@ -0,0 +1,157 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from MCF2Flash.commons.v2_abstract_extension import TaskListV2DataForExtensions
+
+
+@dataclass
+class TaskBatch:
+    """
+    调度器的最小执行单元：同一插件、同一下载目录下的一批任务
+    可合并插件的一个TaskBatch会被一次性写入redis并执行一次插件；不可合并插件的TaskBatch只包含一个任务
+    """
+    ext_name: str
+    driver_info: str
+    download_dir: Optional[str]
+    mergeable: bool
+    tasks: List[TaskListV2DataForExtensions] = field(default_factory=list)
+    # 与tasks一一对应的tasks_list_v2主键
+    task_ids: List[int] = field(default_factory=list)
+    # 不可合并插件的批次所属(driver_info, download_dir)分组的全部任务id，用于按分组一次性读取extra_content
+    group_task_ids: List[int] = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def describe(self) -> str:
+        kind = '可合并' if self.mergeable else '不可合并'
+        where = f"指定下载目录为{self.download_dir}" if self.download_dir else '无专门指定下载目录'
+        return f"{self.driver_info}({kind}子任务-{where}, 共{len(self.tasks)}个任务)"
+
+
+def _is_null(value) -> bool:
+    return value is None or value != value
+
+
+def group_task_batches(rows: pd.DataFrame, namespace: str,
+                       is_mergeable: Callable[[str], bool]) -> Iterator[TaskBatch]:
+    """
+    单次遍历把任务行按(driver_info, download_dir)分组，再按插件是否可合并惰性地产出TaskBatch
+    可合并插件每组产出一个TaskBatch，不可合并插件每个任务单独产出一个TaskBatch；非本namespace的任务会被忽略
+
+    :param rows: tasks_list_v2的记录，至少包含id/task_uid/task_content/task_status/driver_info/download_dir/extra_content
+    :param namespace: 插件namespace
+    :param is_mergeable: 根据插件名判断是否支持把多个任务合并为单次批量执行
+    :return:
+    """
+    # {driver_info: {download_dir: ([task], [id])}}，无指定下载目录的分组以None为key
+    groups: Dict[str, Dict[Optional[str], Tuple[list, list]]] = {}
+    for task_id, task_uid, task_content, task_status, driver_info, download_dir, extra_content in zip(
+            rows['id'], rows['task_uid'], rows['task_content'], rows['task_status'], rows['driver_info'],
+            rows['download_dir'], rows['extra_content']):
+        if _is_null(driver_info) or not driver_info.startswith(namespace):
+            continue
+        download_dir = None if _is_null(download_dir) else download_dir
+        by_dir = groups.setdefault(driver_info, {})
+        if download_dir not in by_dir:
+            by_dir[download_dir] = ([], [])
+        tasks, task_ids = by_dir[download_dir]
+        ns, driver_name = driver_info.split(':')[0], driver_info.split(':')[1]
+        tasks.append(TaskListV2DataForExtensions(task_uid=task_uid,
+                                                 task_content=task_content,
+                                                 task_status=None if _is_null(task_status) else int(task_status),
+                                                 driver_info=driver_info,
+                                                 download_dir=download_dir,
+                                                 extra_content=None if _is_null(extra_content) else extra_content,
+                                                 _namespace=ns,
+                                                 _driver_name=driver_name))
+        task_ids.append(int(task_id))
+
+    for driver_info, by_dir in groups.items():
+        ext_name = driver_info.split(':')[-1]
+        mergeable = is_mergeable(ext_name)
+        # 与之前的执行顺序保持一致：先执行无指定下载目录的任务
+        for download_dir in sorted(by_dir, key=lambda d: d is not None):
+            tasks, task_ids = by_dir[download_dir]
+            if mergeable:
+                yield TaskBatch(ext_name, driver_info, download_dir, True, tasks, task_ids)
+            else:
+                for task, task_id in zip(tasks, task_ids):
+                    yield TaskBatch(ext_name, driver_info, download_dir, False, [task], [task_id], task_ids)
+
+
+def fill_extra_content(batch: TaskBatch, extra_by_id: dict) -> TaskBatch:
+    """
+    把按需读取的extra_content回填到批次中的任务
+
+    :param batch:
+    :param extra_by_id: {id: extra_content}
+    :return:
+    """
+    for task, task_id in zip(batch.tasks, batch.task_ids):
+        task.extra_content = extra_by_id.get(task_id, None)
+    return batch
+
+
+def hydrate_batches(batches: Iterable[TaskBatch],
+                    load_extra_content: Callable[[List[int]], dict]) -> Iterator[TaskBatch]:
+    """
+    惰性地为批次回填extra_content
+    不可合并插件的单任务批次按所属分组一次性读取，之后同组的批次直接从缓存中取用，避免每个任务一条SELECT
+
+    :param batches:
+    :param load_extra_content: 根据任务id读取{id: extra_content}
+    :return:
+    """
+    # {id: extra_content}，已读取但尚未回填的任务；读取结果中没有的id记为None
+    pending: Dict[int, Any] = {}
+    for batch in batches:
+        if any(task_id not in pending for task_id in batch.task_ids):
+            ids = batch.group_task_ids or batch.task_ids
+            extra_by_id = load_extra_content(ids)
+            pending.update((task_id, extra_by_id.get(task_id, None)) for task_id in ids)
+        yield fill_extra_content(batch, {task_id: pending.pop(task_id, None) for task_id in batch.task_ids})
+
+
+class AdaptiveSubBatchSizer(object):
+    """
+    根据观测到的单任务耗时动态调整可合并插件的子批次大小，使每个子批次的执行时间接近target_seconds
+    """
+
+    def __init__(self, max_size: int, target_seconds: float = 0, min_size: int = 1, smoothing: float = 0.3):
+        """
+
+        :param max_size: 子批次大小上限，也是尚无耗时观测时使用的大小
+        :param target_seconds: 期望的子批次执行秒数，小于等于0时固定使用max_size
+        :param min_size: 子批次大小下限
+        :param smoothing: 单任务耗时的指数平滑系数
+        """
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(1, min(int(min_size), self.max_size))
+        self.target_seconds = float(target_seconds)
+        self.smoothing = float(smoothing)
+        self.avg_task_seconds: Optional[float] = None
+
+    def next_size(self) -> int:
+        if self.target_seconds <= 0 or not self.avg_task_seconds:
+            return self.max_size
+        return max(self.min_size, min(self.max_size, int(self.target_seconds / self.avg_task_seconds)))
+
+    def observe(self, task_count: int, seconds: float):
+        """
+        记录一个子批次的执行情况
+
+        :param task_count: 子批次的任务数
+        :param seconds: 子批次的执行秒数
+        :return:
+        """
+        if task_count <= 0:
+            return
+        per_task = max(seconds, 0.0) / task_count
+        if self.avg_task_seconds is None:
+            self.avg_task_seconds = per_task
+        else:
+            self.avg_task_seconds = (1 - self.smoothing) * self.avg_task_seconds + self.smoothing * per_task
+
@@ -0,0 +1,313 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from MCF2Flash.commons.udao import UniversalDAO
+
+# 任务状态, 与TasksListV2.task_status的注释保持一致
+TASK_PENDING = 3
+TASK_ONGOING = 0
+TASK_DONE = 1
+TASK_ERROR = 2
+
+# 调度器切分任务所需的字段，extra_content等大字段在批次真正执行前再按需读取
+SCHEDULER_COLUMNS = ['id', 'task_uid', 'task_content', 'task_status', 'driver_info', 'download_dir']
+
+
+def default_worker_id() -> str:
+    """
+    生成当前进程的worker标识：主机名:进程号:随机后缀
+
+    :return:
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class TaskClaimer(object):
+    """
+    基于 SELECT ... FOR UPDATE SKIP LOCKED 的任务认领工具，需要MySQL 8.0+或MariaDB 10.6+
+    认领时会在同一个事务中把一批PENDING任务（或租约已过期的ONGOING任务）改为ONGOING，并写入worker标识和租约到期时间，
+    从而允许多个Celery worker或多台主机共享同一张tasks_list_v2
+    """
+
+    CLAIM_SELECT_SQL = text(
+        "select id from tasks_list_v2 "
+        "where id > :after_id and (task_status = :pending or (task_status = :ongoing and lease_expires_at < now())) "
+        "order by id limit :limit for update skip locked")
+    CLAIM_UPDATE_SQL = text(
+        "update tasks_list_v2 set task_status = :ongoing, claimed_by = :worker_id, "
+        "lease_expires_at = now() + interval :lease_seconds second where id in :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    LOAD_CLAIMED_SQL = text(
+        f"select {', '.join(SCHEDULER_COLUMNS)} from tasks_list_v2 "
+        "where claimed_by = :worker_id and task_status = :ongoing and id in :ids order by id"
+    ).bindparams(bindparam('ids', expanding=True))
+    LOAD_EXTRA_CONTENT_SQL = text(
+        "select id, extra_content from tasks_list_v2 where id in :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    RENEW_SQL = text(
+        "update tasks_list_v2 set lease_expires_at = now() + interval :lease_seconds second "
+        "where claimed_by = :worker_id and task_status = :ongoing and id in :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    OWNED_SQL = text(
+        "select id from tasks_list_v2 where claimed_by = :worker_id and task_status = :ongoing and id in :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    RELEASE_SQL = text(
+        "update tasks_list_v2 set task_status = :pending, claimed_by = null, lease_expires_at = null "
+        "where claimed_by = :worker_id and task_status = :ongoing")
+
+    def __init__(self, dao: UniversalDAO, logger: Any, worker_id: str, lease_seconds: int = 3600):
+        """
+
+        :param dao: 指向tasks_list_v2所在数据库的DAO，认领器会基于其url使用独立的DAO实例，以便在执行线程中按需读取
+        :param logger:
+        :param worker_id: 当前worker的唯一标识
+        :param lease_seconds: 租约时长（秒），worker崩溃后其认领的任务会在租约过期后被其他worker重新认领
+        """
+        self.dao = UniversalDAO(dao.db_url, logger)
+        self.logger = logger
+        self.worker_id = worker_id
+        self.lease_seconds = int(lease_seconds)
+
+    def claim_batch(self, limit: int, after_id: int = 0) -> List[int]:
+        """
+        在一个事务中认领最多limit个任务
+
+        :param limit: 单次认领的任务数上限
+        :param after_id: 只认领主键大于该值的任务，用于按主键分页
+        :return: 认领到的任务id
+        """
+        dao = self.dao
+        dao.connect()
+        try:
+            ids = [row[0] for row in dao.session.execute(
+                self.CLAIM_SELECT_SQL,
+                {'pending': TASK_PENDING, 'ongoing': TASK_ONGOING, 'limit': int(limit),
+                 'after_id': int(after_id)}).fetchall()]
+            if len(ids) > 0:
+                dao.session.execute(self.CLAIM_UPDATE_SQL,
+                                    {'ongoing': TASK_ONGOING, 'worker_id': self.worker_id,
+                                     'lease_seconds': self.lease_seconds, 'ids': ids})
+            dao.session.commit()
+            return ids
+        except Exception:
+            dao.session.rollback()
+            raise
+        finally:
+            dao.disconnect()
+
+    def renew_lease(self, ids: List[int]) -> List[int]:
+        """
+        在任务即将执行前续期租约，并返回仍归本worker所有的任务id
+        一页任务排队等待期间租约可能已经过期并被其他worker重新认领，这些任务不应再执行
+
+        :param ids: 即将执行的任务id
+        :return: 续期成功（仍归本worker所有）的任务id
+        """
+        if len(ids) == 0:
+            return []
+        # 并行模式下会在多个执行线程中调用，每次使用独立的session
+        params = {'ongoing': TASK_ONGOING, 'worker_id': self.worker_id, 'ids': list(ids)}
+        with self.dao.session_scope() as session:
+            session.execute(self.RENEW_SQL, {**params, 'lease_seconds': self.lease_seconds})
+            owned = {row[0] for row in session.execute(self.OWNED_SQL, params)}
+        lost = len(ids) - len(owned)
+        if lost > 0:
+            self.logger.warning(f"{lost}个任务的租约已过期并被其他worker认领，跳过执行")
+        return [i for i in ids if i in owned]
+
+    def load_claimed(self, ids: List[int]) -> pd.DataFrame:
+        """
+        读取本worker已认领的任务，只包含SCHEDULER_COLUMNS中的字段，extra_content留空
+
+        :param ids: claim_batch返回的任务id
+        :return:
+        """
+        dao = self.dao
+        dao.connect()
+        try:
+            df = pd.read_sql(self.LOAD_CLAIMED_SQL, dao.session.bind,
+                             params={'worker_id': self.worker_id, 'ongoing': TASK_ONGOING, 'ids': list(ids)})
+        finally:
+            dao.disconnect()
+        df['extra_content'] = None
+        return df
+
+    def iter_claimed_pages(self, page_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        按主键顺序逐页认领并读取任务，调度器可以在后续页面认领之前就开始执行已读到的任务
+
+        :param page_rows: 每页的任务数
+        :return:
+        """
+        last_id = 0
+        while True:
+            ids = self.claim_batch(page_rows, after_id=last_id)
+            if len(ids) == 0:
+                return
+            last_id = max(ids)
+            page = self.load_claimed(ids)
+            if len(page) > 0:
+                yield page
+
+    def load_extra_content(self, ids: List[int], chunk_size: int = 1000) -> Dict[int, Any]:
+        """
+        按需读取任务的extra_content
+
+        :param ids: 任务id
+        :param chunk_size: 单条SQL中id的数量上限
+        :return: {id: extra_content}
+        """
+        dao = self.dao
+        extra = {}
+        dao.connect()
+        try:
+            for i in range(0, len(ids), chunk_size):
+                for row in dao.session.execute(self.LOAD_EXTRA_CONTENT_SQL, {'ids': list(ids[i: i + chunk_size])}):
+                    extra[row[0]] = row[1]
+        finally:
+            dao.disconnect()
+        return extra
+
+    def release_unfinished(self) -> int:
+        """
+        把本worker认领但未完成的任务退回PENDING，留给下一轮调度
+
+        :return: 被退回的任务数
+        """
+        dao = self.dao
+        dao.connect()
+        try:
+            result = dao.session.execute(self.RELEASE_SQL, {'pending': TASK_PENDING, 'ongoing': TASK_ONGOING,
+                                                            'worker_id': self.worker_id})
+            dao.session.commit()
+            if result.rowcount > 0:
+                self.logger.info(f"已退回{result.rowcount}个未完成的任务")
+            return result.rowcount
+        except Exception:
+            dao.session.rollback()
+            raise
+        finally:
+            dao.disconnect()
+
+
+class TaskCompletionWriter(object):
+    """
+    缓冲已完成任务的标识，按数量或时间阈值批量标记为DONE
+    task_uid和task_content分别使用独立的参数化UPDATE，以便各自走索引；标识过多时按chunk_size拆分
+    整个调度过程复用同一个DAO会话，线程安全
+    """
+
+    MARK_DONE_BY_UID_SQL = text(
+        "update tasks_list_v2 set task_status = :done where task_uid in :keys"
+    ).bindparams(bindparam('keys', expanding=True))
+    MARK_DONE_BY_CONTENT_SQL = text(
+        "update tasks_list_v2 set task_status = :done where task_content in :keys"
+    ).bindparams(bindparam('keys', expanding=True))
+
+    def __init__(self, dao: UniversalDAO, logger: Any, flush_size: int = 100, flush_interval: float = 5.0,
+                 chunk_size: int = 500):
+        """
+
+        :param dao: 指向tasks_list_v2所在数据库的DAO，写入器会基于其url使用独立的DAO实例
+        :param logger:
+        :param flush_size: 缓冲的标识数量达到该值时立即写入
+        :param flush_interval: 缓冲中最早的标识等待超过该秒数时写入
+        :param chunk_size: 单条UPDATE中标识的数量上限
+        """
+        self.dao = UniversalDAO(dao.db_url, logger)
+        self.logger = logger
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = float(flush_interval)
+        self.chunk_size = max(1, int(chunk_size))
+
+        self._buffer = []
+        self._oldest_at = None
+        self._lock = threading.RLock()
+        self._connected = False
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, name='mcf_completion_writer', daemon=True)
+        self._timer.start()
+
+    def add(self, done_keys: List[Any], flush_now: bool = False):
+        """
+        登记已完成任务的task_uid或task_content
+
+        :param done_keys:
+        :param flush_now: 是否忽略阈值立即写入
+        :return:
+        """
+        if len(done_keys) == 0:
+            return
+        with self._lock:
+            if self._oldest_at is None:
+                self._oldest_at = time.time()
+            self._buffer.extend(done_keys)
+            if flush_now or len(self._buffer) >= self.flush_size:
+                try:
+                    self.flush()
+                except Exception as _:
+                    self.logger.error(traceback.format_exc())
+
+    def flush(self) -> int:
+        """
+        立即把缓冲中的标识写入数据库，写入失败的标识会保留在缓冲中等待下次重试
+
+        :return: 本次写入的标识数量
+        """
+        with self._lock:
+            if len(self._buffer) == 0:
+                return 0
+            keys = list(dict.fromkeys(self._buffer))
+            dao = self.dao
+            if not self._connected:
+                dao.connect()
+                self._connected = True
+            try:
+                for i in range(0, len(keys), self.chunk_size):
+                    chunk = keys[i: i + self.chunk_size]
+                    params = {'done': TASK_DONE, 'keys': chunk}
+                    dao.session.execute(self.MARK_DONE_BY_UID_SQL, params)
+                    dao.session.execute(self.MARK_DONE_BY_CONTENT_SQL, params)
+                dao.session.commit()
+            except Exception:
+                dao.session.rollback()
+                raise
+            self._buffer = []
+            self._oldest_at = None
+            self.logger.info(f"已将{len(keys)}个任务标记为完成")
+            return len(keys)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(1.0, max(0.01, self.flush_interval))):
+            with self._lock:
+                due = self._oldest_at is not None and time.time() - self._oldest_at >= self.flush_interval
+                if due:
+                    try:
+                        self.flush()
+                    except Exception as _:
+                        self.logger.error(traceback.format_exc())
+
+    def close(self):
+        """
+        写入剩余的标识并释放数据库连接
+
+        :return:
+        """
+        self._closed.set()
+        self._timer.join()
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                if self._connected:
+                    self.dao.disconnect()
+                    self._connected = False
+
@@ -0,0 +1,45 @@
+import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from MCF2Flash.entities.defined_entities import TasksListV2
+import MCF2Flash.domains.defined_domains as domains
+
+# defined_repositories的asyncio版本，函数名和语义保持一致
+
+
+async def get_task_by_uid(db: AsyncSession, uuid: str) -> TasksListV2:
+    return await db.scalar(select(TasksListV2).where(TasksListV2.task_uid == uuid))
+
+
+async def get_tasks_by_status(db: AsyncSession, status: int) -> List[TasksListV2]:
+    return list((await db.scalars(select(TasksListV2).filter(TasksListV2.task_status == status))).all())
+
+
+async def get_tasks_by_content(db: AsyncSession, task_content: str, driver_name: str) -> List[TasksListV2]:
+    return list((await db.scalars(select(TasksListV2).filter(TasksListV2.task_content == task_content).filter(
+        TasksListV2.driver_info == driver_name))).all())
+
+
+async def get_tasks(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[TasksListV2]:
+    return list((await db.scalars(select(TasksListV2).offset(skip).limit(limit))).all())
+
+
+async def get_same_special_tasks(db: AsyncSession, sp_task: domains.SingleTaskReceiveSpecial) -> List[TasksListV2]:
+    return list((await db.scalars(select(TasksListV2).filter(TasksListV2.driver_info == sp_task.driver))).all())
+
+
+async def create_task(db: AsyncSession, task_params: domains.TaskRowCreate) -> bool:
+    new_task = TasksListV2(**task_params.model_dump(), deleted_at=datetime.datetime(2077, 1, 1, 8, 0, 0, 0))
+    db.add(new_task)
+    await db.commit()
+    await db.refresh(new_task)
+    return True
+
+
+async def update_task_status(db: AsyncSession, uuid: str, status: int) -> bool:
+    task = await get_task_by_uid(db, uuid)
+    task.task_status = status
+    await db.commit()
+    await db.refresh(task)
+    return True
@@ -4,7 +4,8 @@ from celery.result import AsyncResult
 from fastapi import FastAPI
 from MCF2Flash.loguru_setup import loguru_setup
 from MCF2Flash.celery_core import celery_app
-from MCF2Flash.fastapi_depends import engine
+from MCF2Flash.fastapi_depends import engine, async_engine
+from MCF2Flash.commons.net_io import close_async_redis_pools, close_redis_pools
 from MCF2Flash.controllers import test_view, mcf_v2_view
 from MCF2Flash.fastapi_depends import Dec_Base
 loguru_setup('fast_api')
@@ -34,6 +35,13 @@ def read_root():
     return {"message": "Welcome to MCF 2.0 Flash"}
 
 
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+    await close_async_redis_pools()
+    close_redis_pools()
+
+
 # 可选：本地调试入口
 if __name__ == "__main__":
     import uvicorn
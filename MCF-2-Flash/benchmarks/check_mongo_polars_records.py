@@ -0,0 +1,38 @@
+"""
+检查MongoDAO.iter_record_chunks从polars DataFrame产出的文档都能被BSON编码（Date列、Decimal列），不需要连接mongo
+
+用法：
+    python benchmarks/check_mongo_polars_records.py
+"""
+import datetime
+import decimal
+import pathlib
+import sys
+
+import bson
+import polars as pl
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from MCF2Flash.commons.udao import MongoDAO
+
+
+def main():
+    df = pl.DataFrame({
+        'day': [datetime.date(2024, 1, 1), None, datetime.date(2024, 1, 3)],
+        'amount': [decimal.Decimal('1.10'), decimal.Decimal('-2.25'), None],
+        'name': ['a', 'b', 'c'],
+    }, schema={'day': pl.Date, 'amount': pl.Decimal(10, 2), 'name': pl.Utf8})
+
+    docs = [doc for chunk in MongoDAO.iter_record_chunks(df, chunk_rows=2) for doc in chunk]
+    assert len(docs) == len(df)
+    for doc in docs:
+        bson.encode(doc)
+    assert docs[0]['day'] == datetime.datetime(2024, 1, 1)
+    assert docs[1]['day'] is None
+    assert docs[1]['amount'] == bson.Decimal128('-2.25')
+    assert docs[2]['amount'] is None
+    print(f"OK: {len(docs)} documents encoded")
+
+
+if __name__ == '__main__':
+    main()